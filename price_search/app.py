@@ -1,195 +1,68 @@
-﻿import json
+﻿import hashlib
+import json
 import logging
-import re
-import unicodedata
+import threading
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 
-from duckduckgo_search import DDGS
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from busca import buscar_anuncios
+from metrics import NAO_MODIFICADOS, MetricsMiddleware, resposta_metricas
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def extrair_preco(texto):
-  if not texto:
-    return None
-  match = re.search(r"R\\$\\s?([\\d\\.]+,\\d+)", texto)
-  return match.group(0) if match else None
-
-
-def extrair_area(texto):
-  if not texto:
-    return None
-  match = re.search(r"(\\d+[\\.,]?\\d*)\\s?(ha|hectare|hectares|alqueire|alqueires)", texto, re.IGNORECASE)
-  if match:
-    return f"{match.group(1)} {match.group(2)}"
-  match = re.search(r"(\\d+[\\.,]?\\d*)\\s?m2", texto, re.IGNORECASE)
-  if match:
-    return f"{match.group(1)} m2"
-  return None
-
-
-CLASSE_TERMS = {
-  "A-I": "classe I lavoura",
-  "A-II": "classe II lavoura",
-  "A-III": "classe III lavoura",
-  "A-IV": "classe IV lavoura",
-  "B-V": "classe V pastagem",
-  "B-VI": "classe VI pastagem",
-  "B-VII": "classe VII pastagem",
-  "C-VIII": "classe VIII preservacao",
-}
-
-GOOD_KEYWORDS = [
-  "fazenda",
-  "sitio",
-  "chacara",
-  "imovel rural",
-  "propriedade rural",
-  "area rural",
-  "a venda",
-  "vende",
-]
-
-BAD_KEYWORDS = [
-  "wikipedia",
-  "imdb",
-  "netflix",
-  "prime video",
-  "disney",
-  "serie",
-  "filme",
-  "documentario",
-  "restaurant",
-  "restaurante",
-  "bar & grill",
-  "steam",
-  "game",
-  "tv",
-]
-
-BAD_DOMAINS = [
-  "wikipedia.org",
-  "imdb.com",
-  "britannica.com",
-  "netflix.com",
-  "primevideo.com",
-  "disneyplus.com",
-]
-
-
-
-def normalize_text(text):
-  if not text:
-    return ""
-  normalized = unicodedata.normalize("NFKD", text)
-  cleaned = "".join(ch for ch in normalized if not unicodedata.combining(ch))
-  return cleaned.lower()
-
-def is_bad_result(link, titulo, snippet):
-  text = normalize_text(f"{titulo} {snippet}")
-  if any(keyword in text for keyword in BAD_KEYWORDS):
-    return True
-  if any(domain in link for domain in BAD_DOMAINS):
-    return True
-  return False
-
-
-def is_good_result(titulo, snippet):
-  text = normalize_text(f"{titulo} {snippet}")
-  return any(keyword in text for keyword in GOOD_KEYWORDS)
-
+deral_index = None
+preco_store = None
+aquecimento = {"pronto": False, "erro": None, "segundos": None}
 
-def montar_query(municipio, area_total, areas, usar_classes=True):
-  base = f"fazenda a venda {municipio} imovel rural preco"
-  if not usar_classes:
-    return base
 
-  classes_com_area = [
-    (classe, float(valor))
-    for classe, valor in (areas or {}).items()
-    if float(valor or 0) > 0
-  ]
-
-  classes_com_area.sort(key=lambda item: item[1], reverse=True)
-  termos = []
-  for classe, _valor in classes_com_area[:3]:
-    termo = CLASSE_TERMS.get(classe)
-    if termo:
-      termos.append(termo)
+def aquecer():
+  """Carrega a base DERAL e monta os indices (NumPy e importado so aqui)."""
+  global deral_index, preco_store
+  inicio = time.perf_counter()
+  try:
+    from deral_index import DeralIndex, carregar_registros
+    from price_store import PrecoStore
+
+    registros = carregar_registros()
+    deral_index = DeralIndex(registros)
+    preco_store = PrecoStore(registros)
+    if not len(deral_index) or not len(preco_store):
+      # Sem dados as rotas de preco responderiam 503; o worker nao esta pronto.
+      aquecimento["erro"] = "Base DERAL vazia ou nao encontrada"
+      logger.error("aquecimento_sem_dados registros=%d", len(registros))
+    else:
+      aquecimento["pronto"] = True
+  except Exception as e:
+    aquecimento["erro"] = f"{type(e).__name__}: {e}"
+    logger.exception("aquecimento_erro")
+  finally:
+    aquecimento["segundos"] = round(time.perf_counter() - inicio, 3)
+    logger.info("aquecimento_fim pronto=%s segundos=%.3f", aquecimento["pronto"], aquecimento["segundos"])
 
-  if not termos:
-    return base
 
-  return f"{base} {' '.join(termos)}"
+@asynccontextmanager
+async def lifespan(_app):
+  # Aquece em segundo plano para o worker aceitar conexoes imediatamente;
+  # /ready informa quando os indices estao carregados.
+  threading.Thread(target=aquecer, name="aquecimento", daemon=True).start()
+  yield
 
 
-def executar_busca(query, max_results):
-  try:
-    logger.info(f"Executando busca: {query}")
-    with DDGS() as ddgs:
-      resultados = list(ddgs.text(query, max_results=max_results))
-      logger.info(f"Busca retornou {len(resultados)} resultados")
-      return resultados
-  except Exception as e:
-    logger.error(f"Erro na busca DuckDuckGo: {type(e).__name__}: {e}")
-    return []
-
-
-def buscar_anuncios(municipio, area_total, areas, max_results=6):
-  anuncios = []
-  queries = [
-    montar_query(municipio, area_total, areas, usar_classes=True),
-    montar_query(municipio, area_total, areas, usar_classes=False),
-    f"sitio a venda {municipio} preco",
-    f"chacara a venda {municipio} preco",
-  ]
-
-  resultados = []
-  for i, query in enumerate(queries):
-    logger.info(f"Tentando query {i+1}/{len(queries)}")
-    resultados = executar_busca(query, max_results=max_results * 2)
-    if resultados:
-      logger.info(f"Query {i+1} retornou resultados")
-      break
-    logger.info(f"Query {i+1} sem resultados, tentando proxima...")
-
-  filtrados_bad = 0
-  filtrados_not_good = 0
-  for resultado in resultados:
-    link = resultado.get("href") or resultado.get("url") or ""
-    titulo = resultado.get("title") or resultado.get("heading") or "Anuncio sem titulo"
-    snippet = resultado.get("body") or resultado.get("snippet") or ""
-    if is_bad_result(link, titulo, snippet):
-      filtrados_bad += 1
-      continue
-    if not is_good_result(titulo, snippet) and not extrair_preco(snippet):
-      filtrados_not_good += 1
-      continue
-    preco = extrair_preco(snippet)
-    area = extrair_area(snippet)
-    anuncios.append({
-      "titulo": titulo,
-      "preco": preco,
-      "area": area,
-      "link": link,
-      "municipio": municipio
-    })
-    if len(anuncios) >= max_results:
-      break
-
-  logger.info(f"Resultados: {len(resultados)} brutos, {filtrados_bad} removidos (bad), {filtrados_not_good} removidos (not good), {len(anuncios)} finais")
-  return anuncios
-
-
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
 app.add_middleware(
   CORSMiddleware,
   allow_origins=["*"],
-  allow_methods=["POST"],
+  allow_methods=["GET", "POST"],
   allow_headers=["*"],
+  expose_headers=["ETag"],
 )
 
 
@@ -198,65 +71,148 @@ async def search(payload: dict):
   municipio = payload.get("municipio", "")
   areas = payload.get("areas", {})
   area_total = payload.get("area_total", 0)
-  logger.info(f"Busca recebida - municipio: {municipio}, area_total: {area_total}")
+  logger.info("busca_recebida municipio=%r area_total=%s", municipio, area_total)
   resultados = buscar_anuncios(municipio, area_total, areas)
-  logger.info(f"Busca finalizada - {len(resultados)} anuncios encontrados")
   return {
     "resultados": resultados,
     "timestamp": datetime.now(timezone.utc).isoformat()
   }
 
 
-def carregar_municipios(caminho="municipios.json"):
-  try:
-    with open(caminho, "r", encoding="utf-8") as handle:
-      return json.load(handle)
-  except FileNotFoundError:
-    return []
-
-
-def main():
-  import streamlit as st
+@app.post("/api/estimate")
+def estimate(payload: dict):
+  if deral_index is None or not len(deral_index):
+    raise HTTPException(status_code=503, detail="Base DERAL indisponivel")
 
-  st.title("Pesquisa de Preco de Terras")
-  st.write("Selecione o municipio e informe as areas em ha para cada classe.")
+  municipio = payload.get("municipio") or ""
+  if not isinstance(municipio, str):
+    raise HTTPException(status_code=422, detail="Municipio invalido: esperado texto")
+  areas = payload.get("areas") or {}
+  if not isinstance(areas, dict):
+    raise HTTPException(status_code=422, detail="Areas invalidas: esperado objeto classe -> hectares")
 
-  municipios = carregar_municipios()
-  if municipios:
-    municipio = st.selectbox("Municipio", options=municipios)
-  else:
-    st.warning("municipios.json nao encontrado. Informe manualmente.")
-    municipio = st.text_input("Municipio")
+  t = deral_index.localizar(municipio)
+  if t is None:
+    raise HTTPException(status_code=404, detail=f"Municipio sem dados DERAL: {municipio}")
 
-  areas = {}
-  total_area = 0.0
+  try:
+    areas = deral_index.vetor_areas(areas)
+  except ValueError as e:
+    raise HTTPException(status_code=422, detail=str(e))
+  resposta = {
+    "municipio": deral_index.territorios[t],
+    "referencia": deral_index.estimar(t, areas),
+  }
 
-  col1, col2 = st.columns(2)
-  with col1:
-    for classe in ["A-I", "A-II", "A-III", "A-IV"]:
-      valor = st.number_input(f"{classe} (ha)", min_value=0.0, step=0.01)
-      areas[classe] = valor
-      total_area += valor
-  with col2:
-    for classe in ["B-V", "B-VI", "B-VII", "C-VIII"]:
-      valor = st.number_input(f"{classe} (ha)", min_value=0.0, step=0.01)
-      areas[classe] = valor
-      total_area += valor
+  ano = payload.get("ano")
+  if ano is not None:
+    try:
+      ano = int(ano)
+    except (TypeError, ValueError):
+      raise HTTPException(status_code=422, detail=f"Ano invalido: {ano}")
+    comparacao = deral_index.estimar_ano(t, areas, ano)
+    if comparacao is None:
+      raise HTTPException(status_code=404, detail=f"Ano sem dados DERAL: {ano}")
+    total_ref = resposta["referencia"]["total"]
+    comparacao["variacao"] = (total_ref / comparacao["total"] - 1) if comparacao["total"] > 0 else None
+    resposta["comparacao"] = comparacao
+
+  return resposta
+
+
+@app.post("/api/estimate/bulk")
+async def estimate_bulk(request: Request, formato: str = None, ano: int = None):
+  from bulk import receber_corpo, valorar_arquivo
+
+  if deral_index is None or not len(deral_index):
+    raise HTTPException(status_code=503, detail="Base DERAL indisponivel")
+  if formato not in (None, "csv", "ndjson"):
+    raise HTTPException(status_code=422, detail=f"Formato invalido: {formato}")
+  if formato is None and "csv" in request.headers.get("content-type", ""):
+    formato = "csv"
+
+  corpo = await receber_corpo(request.stream())
+  return StreamingResponse(
+    valorar_arquivo(deral_index, corpo, formato=formato, ano=ano),
+    media_type="application/x-ndjson",
+  )
+
+
+def _lista(valores):
+  return [item.strip() for valor in (valores or []) for item in valor.split(",") if item.strip()]
+
+
+def _etag_confere(etag, if_none_match):
+  """Comparacao fraca do ETag com a lista de If-None-Match (RFC 9110), incluindo `*`."""
+  if not if_none_match:
+    return False
+  alvo = etag.removeprefix("W/")
+  for item in if_none_match.split(","):
+    item = item.strip()
+    if item == "*" or item.removeprefix("W/") == alvo:
+      return True
+  return False
 
-  st.write(f"**Total:** {total_area:.2f} ha")
 
-  if st.button("Pesquisar") and municipio and total_area > 0:
-    with st.spinner("Buscando propriedades..."):
-      resultados = buscar_anuncios(municipio, total_area, areas)
+@app.get("/api/prices")
+def prices(
+  request: Request,
+  ano_min: int = None,
+  ano_max: int = None,
+  nivel: str = None,
+  regioes: list[str] = Query(None),
+  mesorregioes: list[str] = Query(None),
+  territorios: list[str] = Query(None),
+  categorias: list[str] = Query(None),
+  subcategorias: list[str] = Query(None),
+  offset: int = Query(0, ge=0),
+  limite: int = Query(1000, ge=0, le=10000),
+  agregados: bool = False,
+):
+  if preco_store is None or not len(preco_store):
+    raise HTTPException(status_code=503, detail="Base DERAL indisponivel")
+
+  filtros = {
+    "niveis": [nivel] if nivel else [],
+    "regioes": _lista(regioes),
+    "mesorregioes": _lista(mesorregioes),
+    "territorios": _lista(territorios),
+    "categorias": _lista(categorias),
+    "subcategorias": _lista(subcategorias),
+  }
+  chave = json.dumps(
+    [preco_store.versao, ano_min, ano_max, {k: sorted(v) for k, v in filtros.items()}, offset, limite, agregados],
+    ensure_ascii=False,
+  )
+  etag = f'W/"{hashlib.sha1(chave.encode("utf-8")).hexdigest()[:20]}"'
+  headers = {"ETag": etag, "Cache-Control": "no-cache"}
+  if _etag_confere(etag, request.headers.get("if-none-match")):
+    NAO_MODIFICADOS.labels("/api/prices").inc()
+    return Response(status_code=304, headers=headers)
+
+  indices = preco_store.filtrar(ano_min=ano_min, ano_max=ano_max, **filtros)
+  resposta = {
+    "total": int(len(indices)),
+    "offset": offset,
+    "limite": limite,
+    "registros": preco_store.linhas(indices[offset:offset + limite]),
+  }
+  if agregados:
+    resposta["agregados"] = preco_store.agregados(indices)
+  return JSONResponse(resposta, headers=headers)
 
-    st.success(f"Foram encontrados {len(resultados)} anuncios.")
-    for item in resultados:
-      st.markdown(f"* **{item['titulo']}** - {item['preco'] or 'sem preco'}")
-      if item.get("link"):
-        st.markdown(f"  <{item['link']}>", unsafe_allow_html=True)
-      st.markdown("---")
 
+@app.get("/ready")
+def ready():
+  estado = {
+    **aquecimento,
+    "deral_municipios": len(deral_index) if deral_index is not None else 0,
+    "precos_registros": len(preco_store) if preco_store is not None else 0,
+  }
+  return JSONResponse(estado, status_code=200 if aquecimento["pronto"] else 503)
 
-if __name__ == "__main__":
-  main()
 
+@app.get("/metrics")
+def metrics():
+  conteudo, tipo = resposta_metricas()
+  return Response(content=conteudo, media_type=tipo)
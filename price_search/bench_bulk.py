@@ -0,0 +1,117 @@
+"""Benchmark de propriedades/segundo da valoracao em massa.
+
+Gera uma carteira sintetica e mede o nucleo vetorizado e o endpoint
+`POST /api/estimate/bulk` (em processo, ou em `--url` se informado).
+
+Uso:
+  python bench_bulk.py --n 200000
+  python bench_bulk.py --n 200000 --url http://localhost:8000
+"""
+import argparse
+import json
+import random
+import time
+import urllib.error
+import urllib.request
+
+from bulk import ler_propriedades, valorar_stream
+from deral_index import CLASSES, DeralIndex, carregar_registros
+
+
+def gerar_carteira(municipios, n, seed=42):
+  rng = random.Random(seed)
+  yield "id,municipio," + ",".join(CLASSES) + "\n"
+  for i in range(n):
+    areas = [f"{rng.uniform(0, 50):.2f}" if rng.random() < 0.5 else "0" for _ in CLASSES]
+    yield f"{i},{rng.choice(municipios)}," + ",".join(areas) + "\n"
+
+
+def medir_nucleo(index, n):
+  inicio = time.perf_counter()
+  linhas = 0
+  for bloco in valorar_stream(index, ler_propriedades(gerar_carteira(index.territorios, n))):
+    linhas += bloco.count("\n")
+  return linhas, time.perf_counter() - inicio
+
+
+def aguardar_pronto(status_ready, timeout=120):
+  """Espera `/ready` devolver 200: a app carrega os indices em segundo plano."""
+  limite = time.perf_counter() + timeout
+  while time.perf_counter() < limite:
+    if status_ready() == 200:
+      return
+    time.sleep(0.05)
+  raise SystemExit("A API nao ficou pronta a tempo (/ready).")
+
+
+def medir_http(url, municipios, n):
+  url = url.rstrip("/")
+
+  def status_ready():
+    try:
+      with urllib.request.urlopen(f"{url}/ready") as resposta:
+        return resposta.status
+    except (urllib.error.URLError, OSError):
+      return None
+
+  aguardar_pronto(status_ready)
+  corpo = "".join(gerar_carteira(municipios, n)).encode("utf-8")
+  requisicao = urllib.request.Request(
+    f"{url}/api/estimate/bulk",
+    data=corpo,
+    headers={"Content-Type": "text/csv"},
+    method="POST",
+  )
+  inicio = time.perf_counter()
+  linhas = 0
+  with urllib.request.urlopen(requisicao) as resposta:
+    if resposta.status != 200:
+      raise SystemExit(f"/api/estimate/bulk respondeu {resposta.status}")
+    for _linha in resposta:
+      linhas += 1
+  return linhas, time.perf_counter() - inicio
+
+
+def medir_em_processo(municipios, n):
+  from fastapi.testclient import TestClient
+
+  import app
+
+  corpo = "".join(gerar_carteira(municipios, n)).encode("utf-8")
+  with TestClient(app.app) as client:
+    aguardar_pronto(lambda: client.get("/ready").status_code)
+    inicio = time.perf_counter()
+    linhas = 0
+    with client.stream("POST", "/api/estimate/bulk", content=corpo, headers={"Content-Type": "text/csv"}) as resposta:
+      if resposta.status_code != 200:
+        raise SystemExit(f"/api/estimate/bulk respondeu {resposta.status_code}: {resposta.read().decode()[:200]}")
+      for _linha in resposta.iter_lines():
+        linhas += 1
+    return linhas, time.perf_counter() - inicio
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--n", type=int, default=100000, help="numero de propriedades")
+  parser.add_argument("--url", help="URL da API ja rodando (padrao: em processo)")
+  args = parser.parse_args()
+
+  index = DeralIndex(carregar_registros())
+  if not len(index):
+    raise SystemExit("Base DERAL vazia ou nao encontrada.")
+
+  resultados = {"n": args.n}
+  linhas, segundos = medir_nucleo(index, args.n)
+  resultados["nucleo_props_s"] = round(linhas / segundos)
+
+  if args.url:
+    linhas, segundos = medir_http(args.url, index.territorios, args.n)
+  else:
+    linhas, segundos = medir_em_processo(index.territorios, args.n)
+  resultados["endpoint_props_s"] = round(linhas / segundos)
+
+  print(json.dumps(resultados))
+
+
+if __name__ == "__main__":
+  main()
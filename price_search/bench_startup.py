@@ -0,0 +1,97 @@
+"""Benchmark de cold start da API.
+
+Mede, em interpretadores novos, o tempo de `import app` e, subindo o uvicorn,
+o tempo ate a primeira resposta HTTP e ate `/ready` devolver 200.
+
+Uso:
+  python bench_startup.py
+  python bench_startup.py --repeticoes 10 --limite-import-ms 800
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def medir_import():
+  codigo = "import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)"
+  saida = subprocess.run(
+    [sys.executable, "-c", codigo], cwd=DIR, capture_output=True, text=True, check=True,
+  )
+  return float(saida.stdout.strip().splitlines()[-1]) * 1000
+
+
+def porta_livre():
+  with socket.socket() as sock:
+    sock.bind(("127.0.0.1", 0))
+    return sock.getsockname()[1]
+
+
+def medir_servidor(timeout=60):
+  porta = porta_livre()
+  url = f"http://127.0.0.1:{porta}/ready"
+  inicio = time.perf_counter()
+  processo = subprocess.Popen(
+    [sys.executable, "-m", "uvicorn", "app:app", "--port", str(porta), "--log-level", "warning"],
+    cwd=DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+  )
+  primeira_resposta = None
+  pronto = None
+  try:
+    while time.perf_counter() - inicio < timeout:
+      try:
+        with urllib.request.urlopen(url, timeout=1) as resposta:
+          status = resposta.status
+      except urllib.error.HTTPError as erro:
+        status = erro.code
+      except (urllib.error.URLError, ConnectionError):
+        time.sleep(0.01)
+        continue
+      agora = (time.perf_counter() - inicio) * 1000
+      if primeira_resposta is None:
+        primeira_resposta = agora
+      if status == 200:
+        pronto = agora
+        break
+      time.sleep(0.01)
+  finally:
+    processo.terminate()
+    processo.wait()
+  return primeira_resposta, pronto
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--repeticoes", type=int, default=5)
+  parser.add_argument("--limite-import-ms", type=float, help="falha se a mediana do import passar deste valor")
+  parser.add_argument("--sem-servidor", action="store_true", help="mede apenas o import")
+  args = parser.parse_args()
+
+  imports = [medir_import() for _ in range(args.repeticoes)]
+  resultado = {
+    "import_ms_mediana": round(statistics.median(imports), 1),
+    "import_ms_min": round(min(imports), 1),
+  }
+
+  if not args.sem_servidor:
+    medicoes = [medir_servidor() for _ in range(args.repeticoes)]
+    primeiras = [m[0] for m in medicoes if m[0] is not None]
+    prontos = [m[1] for m in medicoes if m[1] is not None]
+    resultado["primeira_resposta_ms_mediana"] = round(statistics.median(primeiras), 1) if primeiras else None
+    resultado["pronto_ms_mediana"] = round(statistics.median(prontos), 1) if prontos else None
+
+  print(json.dumps(resultado))
+  if args.limite_import_ms and resultado["import_ms_mediana"] > args.limite_import_ms:
+    raise SystemExit(f"Import de app levou {resultado['import_ms_mediana']} ms (limite {args.limite_import_ms} ms)")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,142 @@
+import csv
+import io
+import json
+import tempfile
+
+import numpy as np
+
+from deral_index import AREA_MAXIMA_HA, CLASSES
+
+TAMANHO_LOTE = 2048
+
+
+def detectar_formato(primeira_linha):
+  return "ndjson" if primeira_linha.lstrip().startswith("{") else "csv"
+
+
+def _area(valor):
+  """Hectares de um campo; NaN quando o valor nao e numerico (a linha vira invalida)."""
+  try:
+    return float(str(valor).replace(",", "."))
+  except ValueError:
+    return np.nan
+
+
+def _propriedade_ndjson(linha, numero):
+  try:
+    dados = json.loads(linha)
+  except json.JSONDecodeError:
+    return numero, None, {}
+  # Linhas validas como JSON mas fora do formato viram "linha invalida" so para
+  # a propria linha; um erro aqui derrubaria o lote e o resto do stream.
+  if not isinstance(dados, dict):
+    return numero, None, {}
+  areas = dados.get("areas") or {classe: dados.get(classe) for classe in CLASSES}
+  municipio = dados.get("municipio") or ""
+  if not isinstance(areas, dict) or not isinstance(municipio, str):
+    return dados.get("id", numero), None, {}
+  return dados.get("id"), municipio, areas
+
+
+def ler_propriedades(linhas, formato=None):
+  """Gera (id, municipio, areas) a partir de linhas CSV (com cabecalho) ou NDJSON.
+
+  As linhas sao consumidas sob demanda, entao a entrada pode ser arbitrariamente grande.
+  """
+  linhas = (linha for linha in linhas if linha.strip())
+  primeira = next(linhas, None)
+  if primeira is None:
+    return
+  formato = formato or detectar_formato(primeira)
+
+  if formato == "ndjson":
+    yield _propriedade_ndjson(primeira, 1)
+    for numero, linha in enumerate(linhas, start=2):
+      yield _propriedade_ndjson(linha, numero)
+    return
+
+  cabecalho = [coluna.strip() for coluna in next(csv.reader([primeira]))]
+  for numero, row in enumerate(csv.DictReader(linhas, fieldnames=cabecalho), start=1):
+    yield row.get("id") or numero, row.get("municipio", ""), row
+
+
+def _indice(index, municipio):
+  if municipio is None:
+    return -1
+  idx = index.localizar(municipio)
+  return -1 if idx is None else idx
+
+
+def _valorar_lote(index, lote, ano):
+  n = len(lote)
+  t = np.fromiter((_indice(index, municipio) for _id, municipio, _areas in lote), dtype=np.intp, count=n)
+  brutos = [valores.get(classe) or "0" for _id, _municipio, valores in lote for classe in CLASSES]
+  try:
+    areas = np.array([str(valor).replace(",", ".") for valor in brutos], dtype=np.float64)
+  except ValueError:
+    areas = np.fromiter((_area(valor) for valor in brutos), dtype=np.float64, count=len(brutos))
+  areas = areas.reshape(n, len(CLASSES))
+  # Area nao numerica, infinita ou absurda invalida so a propria linha.
+  invalida = ~(np.isfinite(areas) & (areas <= AREA_MAXIMA_HA)).all(axis=1)
+  areas[invalida] = 0.0
+  areas = np.maximum(areas, 0.0)
+
+  total, area_valorada, ano_ref = index.estimar_lote(t, areas, ano)
+  area_total = areas.sum(axis=1)
+  with np.errstate(invalid="ignore", divide="ignore"):
+    media_ha = np.where(area_valorada > 0, total / area_valorada, 0.0)
+
+  saida = []
+  for i, (id_, municipio, _areas) in enumerate(lote):
+    item = {
+      "id": id_,
+      "municipio": index.territorios[t[i]] if t[i] >= 0 else municipio,
+      "ano": int(ano_ref[i]) or None,
+      "total": float(total[i]),
+      "media_ha": float(media_ha[i]),
+      "area_total": float(area_total[i]),
+      "area_valorada": float(area_valorada[i]),
+    }
+    if municipio is None or invalida[i]:
+      item["erro"] = "linha invalida"
+    elif t[i] < 0:
+      item["erro"] = "municipio sem dados DERAL"
+    saida.append(json.dumps(item, ensure_ascii=False) + "\n")
+  return "".join(saida)
+
+
+def valorar_stream(index, propriedades, ano=None, tamanho_lote=TAMANHO_LOTE):
+  """Valora propriedades em lotes e gera blocos NDJSON a medida que ficam prontos.
+
+  No maximo `tamanho_lote` propriedades ficam em memoria ao mesmo tempo.
+  """
+  lote = []
+  for propriedade in propriedades:
+    lote.append(propriedade)
+    if len(lote) >= tamanho_lote:
+      yield _valorar_lote(index, lote, ano)
+      lote = []
+  if lote:
+    yield _valorar_lote(index, lote, ano)
+
+
+async def receber_corpo(stream, limite_memoria=8 * 1024 * 1024):
+  """Copia o corpo da requisicao para um arquivo temporario (em disco acima de `limite_memoria`).
+
+  O corpo precisa ser lido por inteiro antes da resposta comecar: o StreamingResponse
+  escuta `receive()` para detectar desconexao e disputaria as mensagens do corpo.
+  """
+  arquivo = tempfile.SpooledTemporaryFile(max_size=limite_memoria, mode="w+b")
+  async for bloco in stream:
+    arquivo.write(bloco)
+  arquivo.seek(0)
+  return arquivo
+
+
+def valorar_arquivo(index, arquivo, formato=None, ano=None, tamanho_lote=TAMANHO_LOTE):
+  """Valora um arquivo binario (CSV/NDJSON) em lotes, fechando-o ao final."""
+  try:
+    linhas = io.TextIOWrapper(arquivo, encoding="utf-8-sig", newline="")
+    yield from valorar_stream(index, ler_propriedades(linhas, formato), ano=ano, tamanho_lote=tamanho_lote)
+  finally:
+    arquivo.close()
@@ -0,0 +1,38 @@
+"""Valoracao em massa de propriedades pela linha de comando.
+
+Uso:
+  python bulk_estimate.py carteira.csv > valores.ndjson
+  cat carteira.ndjson | python bulk_estimate.py - --ano 2020
+"""
+import argparse
+import sys
+
+from bulk import TAMANHO_LOTE, ler_propriedades, valorar_stream
+from deral_index import DeralIndex, carregar_registros
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Valora propriedades (CSV/NDJSON) com os precos DERAL.")
+  parser.add_argument("entrada", help="arquivo CSV/NDJSON ou '-' para stdin")
+  parser.add_argument("--formato", choices=["csv", "ndjson"], help="detectado automaticamente se omitido")
+  parser.add_argument("--ano", type=int, help="usa os precos deste ano em vez dos mais recentes")
+  parser.add_argument("--dados", help="caminho do detailed.json (padrao: DERAL_DATA_PATH ou dashboard)")
+  parser.add_argument("--lote", type=int, default=TAMANHO_LOTE, help="propriedades por lote vetorizado")
+  args = parser.parse_args()
+
+  index = DeralIndex(carregar_registros(args.dados))
+  if not len(index):
+    raise SystemExit("Base DERAL vazia ou nao encontrada.")
+
+  entrada = sys.stdin if args.entrada == "-" else open(args.entrada, "r", encoding="utf-8-sig", newline="")
+  try:
+    propriedades = ler_propriedades(entrada, args.formato)
+    for bloco in valorar_stream(index, propriedades, ano=args.ano, tamanho_lote=args.lote):
+      sys.stdout.write(bloco)
+  finally:
+    if entrada is not sys.stdin:
+      entrada.close()
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,226 @@
+import importlib
+import logging
+import os
+import re
+import time
+import unicodedata
+
+from metrics import (
+  ANUNCIOS,
+  BUSCAS_VAZIAS,
+  QUERIES,
+  RESULTADOS_FILTRADOS,
+  UPSTREAM_LATENCY,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def extrair_preco(texto):
+  if not texto:
+    return None
+  match = re.search(r"R\\$\\s?([\\d\\.]+,\\d+)", texto)
+  return match.group(0) if match else None
+
+
+def extrair_area(texto):
+  if not texto:
+    return None
+  match = re.search(r"(\\d+[\\.,]?\\d*)\\s?(ha|hectare|hectares|alqueire|alqueires)", texto, re.IGNORECASE)
+  if match:
+    return f"{match.group(1)} {match.group(2)}"
+  match = re.search(r"(\\d+[\\.,]?\\d*)\\s?m2", texto, re.IGNORECASE)
+  if match:
+    return f"{match.group(1)} m2"
+  return None
+
+
+CLASSE_TERMS = {
+  "A-I": "classe I lavoura",
+  "A-II": "classe II lavoura",
+  "A-III": "classe III lavoura",
+  "A-IV": "classe IV lavoura",
+  "B-V": "classe V pastagem",
+  "B-VI": "classe VI pastagem",
+  "B-VII": "classe VII pastagem",
+  "C-VIII": "classe VIII preservacao",
+}
+
+GOOD_KEYWORDS = [
+  "fazenda",
+  "sitio",
+  "chacara",
+  "imovel rural",
+  "propriedade rural",
+  "area rural",
+  "a venda",
+  "vende",
+]
+
+BAD_KEYWORDS = [
+  "wikipedia",
+  "imdb",
+  "netflix",
+  "prime video",
+  "disney",
+  "serie",
+  "filme",
+  "documentario",
+  "restaurant",
+  "restaurante",
+  "bar & grill",
+  "steam",
+  "game",
+  "tv",
+]
+
+BAD_DOMAINS = [
+  "wikipedia.org",
+  "imdb.com",
+  "britannica.com",
+  "netflix.com",
+  "primevideo.com",
+  "disneyplus.com",
+]
+
+
+
+def normalize_text(text):
+  if not text:
+    return ""
+  normalized = unicodedata.normalize("NFKD", text)
+  cleaned = "".join(ch for ch in normalized if not unicodedata.combining(ch))
+  return cleaned.lower()
+
+def is_bad_result(link, titulo, snippet):
+  text = normalize_text(f"{titulo} {snippet}")
+  if any(keyword in text for keyword in BAD_KEYWORDS):
+    return True
+  if any(domain in link for domain in BAD_DOMAINS):
+    return True
+  return False
+
+
+def is_good_result(titulo, snippet):
+  text = normalize_text(f"{titulo} {snippet}")
+  return any(keyword in text for keyword in GOOD_KEYWORDS)
+
+
+def montar_query(municipio, area_total, areas, usar_classes=True):
+  base = f"fazenda a venda {municipio} imovel rural preco"
+  if not usar_classes:
+    return base
+
+  classes_com_area = [
+    (classe, float(valor))
+    for classe, valor in (areas or {}).items()
+    if float(valor or 0) > 0
+  ]
+
+  classes_com_area.sort(key=lambda item: item[1], reverse=True)
+  termos = []
+  for classe, _valor in classes_com_area[:3]:
+    termo = CLASSE_TERMS.get(classe)
+    if termo:
+      termos.append(termo)
+
+  if not termos:
+    return base
+
+  return f"{base} {' '.join(termos)}"
+
+
+def buscar_duckduckgo(query, max_results):
+  # Importado aqui para nao pesar no cold start da API.
+  from duckduckgo_search import DDGS
+
+  with DDGS() as ddgs:
+    return list(ddgs.text(query, max_results=max_results))
+
+
+_provedor = None
+
+
+def obter_provedor():
+  """Funcao (query, max_results) -> resultados usada nas buscas.
+
+  Por padrao e o DuckDuckGo; `PRICE_SEARCH_PROVIDER=modulo:funcao` troca o
+  provedor (ex.: `fake_provider:buscar` nos testes de carga).
+  """
+  global _provedor
+  if _provedor is None:
+    alvo = os.environ.get("PRICE_SEARCH_PROVIDER")
+    if alvo:
+      modulo, funcao = alvo.split(":")
+      _provedor = getattr(importlib.import_module(modulo), funcao)
+    else:
+      _provedor = buscar_duckduckgo
+  return _provedor
+
+
+def executar_busca(query, max_results, nivel=1):
+  inicio = time.perf_counter()
+  resultado = "erro"
+  try:
+    resultados = obter_provedor()(query, max_results)
+    resultado = "ok" if resultados else "vazio"
+    return resultados
+  except Exception as e:
+    logger.error("busca_erro nivel=%d erro=%s detalhe=%s", nivel, type(e).__name__, e)
+    return []
+  finally:
+    duracao = time.perf_counter() - inicio
+    UPSTREAM_LATENCY.labels(str(nivel), resultado).observe(duracao)
+    QUERIES.labels(str(nivel), resultado).inc()
+    logger.info("busca_upstream nivel=%d resultado=%s duracao=%.3f query=%r", nivel, resultado, duracao, query)
+
+
+def buscar_anuncios(municipio, area_total, areas, max_results=6):
+  anuncios = []
+  queries = [
+    montar_query(municipio, area_total, areas, usar_classes=True),
+    montar_query(municipio, area_total, areas, usar_classes=False),
+    f"sitio a venda {municipio} preco",
+    f"chacara a venda {municipio} preco",
+  ]
+
+  resultados = []
+  for nivel, query in enumerate(queries, start=1):
+    resultados = executar_busca(query, max_results=max_results * 2, nivel=nivel)
+    if resultados:
+      break
+
+  filtrados_bad = 0
+  filtrados_not_good = 0
+  for resultado in resultados:
+    link = resultado.get("href") or resultado.get("url") or ""
+    titulo = resultado.get("title") or resultado.get("heading") or "Anuncio sem titulo"
+    snippet = resultado.get("body") or resultado.get("snippet") or ""
+    if is_bad_result(link, titulo, snippet):
+      filtrados_bad += 1
+      continue
+    if not is_good_result(titulo, snippet) and not extrair_preco(snippet):
+      filtrados_not_good += 1
+      continue
+    preco = extrair_preco(snippet)
+    area = extrair_area(snippet)
+    anuncios.append({
+      "titulo": titulo,
+      "preco": preco,
+      "area": area,
+      "link": link,
+      "municipio": municipio
+    })
+    if len(anuncios) >= max_results:
+      break
+
+  RESULTADOS_FILTRADOS.labels("bad").inc(filtrados_bad)
+  RESULTADOS_FILTRADOS.labels("not_good").inc(filtrados_not_good)
+  ANUNCIOS.inc(len(anuncios))
+  if not anuncios:
+    BUSCAS_VAZIAS.labels("upstream" if not resultados else "filtros").inc()
+  logger.info(
+    "busca_filtrada brutos=%d bad=%d not_good=%d finais=%d",
+    len(resultados), filtrados_bad, filtrados_not_good, len(anuncios),
+  )
+  return anuncios
@@ -0,0 +1,201 @@
+import json
+import logging
+import math
+import os
+import unicodedata
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DATA_PATH = os.path.join(BASE_DIR, "dashboard", "public", "data", "detailed.json")
+
+CLASSES = ["A-I", "A-II", "A-III", "A-IV", "B-V", "B-VI", "B-VII", "C-VIII"]
+
+# Limite de sanidade por classe (o Parana inteiro tem ~2e7 ha); acima disso o
+# produto area x preco pode estourar o float.
+AREA_MAXIMA_HA = 1e9
+
+
+def normalize_key(text):
+  if not text:
+    return ""
+  normalized = unicodedata.normalize("NFKD", str(text))
+  cleaned = "".join(ch for ch in normalized if not unicodedata.combining(ch))
+  return " ".join(cleaned.lower().split())
+
+
+def carregar_registros(caminho=None):
+  caminho = caminho or os.environ.get("DERAL_DATA_PATH") or DEFAULT_DATA_PATH
+  try:
+    with open(caminho, "r", encoding="utf-8") as handle:
+      return json.load(handle)
+  except FileNotFoundError:
+    logger.warning("Base DERAL nao encontrada em %s", caminho)
+    return []
+
+
+class DeralIndex:
+  """Indice denso territorio x classe x ano com os precos DERAL (R$/ha).
+
+  `precos[t, c, a]` guarda a media dos registros do municipio `t`, classe `c`
+  e ano `anos[a]`, ou NaN quando nao ha preco. `ultimo_preco`/`ultimo_ano`
+  guardam, por municipio e classe, o preco mais recente disponivel.
+  """
+
+  def __init__(self, registros):
+    registros = [
+      row for row in registros
+      if row.get("nivel") == "Municipio"
+      and row.get("subcategoria") in CLASSES
+      and row.get("territorio")
+      and row.get("ano")
+      and row.get("preco") is not None
+    ]
+
+    nomes = sorted({row["territorio"] for row in registros})
+    self.territorios = nomes
+    self.territorio_idx = {normalize_key(nome): idx for idx, nome in enumerate(nomes)}
+    self._nomes_vistos = {}
+    self.classe_idx = {classe: idx for idx, classe in enumerate(CLASSES)}
+
+    anos = sorted({int(row["ano"]) for row in registros})
+    self.anos = anos
+    self.ano_idx = {ano: idx for idx, ano in enumerate(anos)}
+
+    shape = (len(nomes), len(CLASSES), len(anos))
+    soma = np.zeros(shape, dtype=np.float64)
+    contagem = np.zeros(shape, dtype=np.int32)
+    if registros:
+      t = np.fromiter(
+        (self.territorio_idx[normalize_key(row["territorio"])] for row in registros),
+        dtype=np.intp, count=len(registros),
+      )
+      c = np.fromiter((self.classe_idx[row["subcategoria"]] for row in registros), dtype=np.intp, count=len(registros))
+      a = np.fromiter((self.ano_idx[int(row["ano"])] for row in registros), dtype=np.intp, count=len(registros))
+      p = np.fromiter((float(row["preco"]) for row in registros), dtype=np.float64, count=len(registros))
+      np.add.at(soma, (t, c, a), p)
+      np.add.at(contagem, (t, c, a), 1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+      self.precos = np.where(contagem > 0, soma / np.maximum(contagem, 1), np.nan)
+
+    # Ultimo ano com preco por (territorio, classe): indice do maior ano valido.
+    validos = ~np.isnan(self.precos)
+    if len(anos):
+      reverso = validos[:, :, ::-1]
+      ultimo = len(anos) - 1 - np.argmax(reverso, axis=2)
+      tem_preco = validos.any(axis=2)
+      self.ultimo_preco = np.where(
+        tem_preco,
+        np.take_along_axis(self.precos, ultimo[:, :, None], axis=2)[:, :, 0],
+        np.nan,
+      )
+      self.ultimo_ano = np.where(tem_preco, np.asarray(anos)[ultimo], 0)
+    else:
+      self.ultimo_preco = np.full(shape[:2], np.nan)
+      self.ultimo_ano = np.zeros(shape[:2], dtype=np.int64)
+
+    logger.info(
+      "Indice DERAL carregado: %d municipios, %d classes, %d anos",
+      len(nomes), len(CLASSES), len(anos),
+    )
+
+  def __len__(self):
+    return len(self.territorios)
+
+  def localizar(self, municipio):
+    # Cache por grafia recebida: em lotes o mesmo municipio se repete muito.
+    try:
+      return self._nomes_vistos[municipio]
+    except KeyError:
+      pass
+    idx = self.territorio_idx.get(normalize_key(municipio))
+    if len(self._nomes_vistos) < 10000:
+      self._nomes_vistos[municipio] = idx
+    return idx
+
+  def vetor_areas(self, areas):
+    """Vetor de hectares por classe. Levanta ValueError para area infinita, NaN ou absurda."""
+    vetor = np.zeros(len(CLASSES), dtype=np.float64)
+    for classe, valor in (areas or {}).items():
+      idx = self.classe_idx.get(classe)
+      if idx is None:
+        continue
+      try:
+        area = float(valor or 0)
+      except (TypeError, ValueError):
+        continue
+      if not math.isfinite(area) or area > AREA_MAXIMA_HA:
+        raise ValueError(f"Area invalida para {classe}: {valor}")
+      vetor[idx] = max(area, 0.0)
+    return vetor
+
+  def _valorar(self, areas, precos, anos):
+    com_preco = ~np.isnan(precos)
+    valores = np.where(com_preco, areas * np.nan_to_num(precos), 0.0)
+    total = float(valores.sum())
+    area_total = float(areas.sum())
+    area_valorada = float(areas[com_preco].sum())
+    classes = {}
+    sem_preco = []
+    for idx, classe in enumerate(CLASSES):
+      if areas[idx] <= 0:
+        continue
+      if not com_preco[idx]:
+        sem_preco.append(classe)
+        continue
+      classes[classe] = {
+        "area": float(areas[idx]),
+        "preco": float(precos[idx]),
+        "valor": float(valores[idx]),
+        "ano": int(anos[idx]),
+      }
+    anos_usados = [info["ano"] for info in classes.values()]
+    return {
+      "ano": max(anos_usados) if anos_usados else None,
+      "ano_min": min(anos_usados) if anos_usados else None,
+      "total": total,
+      "media_ha": total / area_valorada if area_valorada > 0 else 0.0,
+      "area_total": area_total,
+      "area_valorada": area_valorada,
+      "classes": classes,
+      "sem_preco": sem_preco,
+    }
+
+  def estimar(self, t, areas):
+    """Valor de referencia usando o preco mais recente de cada classe."""
+    return self._valorar(areas, self.ultimo_preco[t], self.ultimo_ano[t])
+
+  def estimar_ano(self, t, areas, ano):
+    """Valor de referencia usando apenas os precos de `ano`."""
+    a = self.ano_idx.get(ano)
+    if a is None:
+      return None
+    return self._valorar(areas, self.precos[t, :, a], np.full(len(CLASSES), ano))
+
+  def estimar_lote(self, t, areas, ano=None):
+    """Valoracao vetorizada de um lote de propriedades.
+
+    `t` e um vetor (N,) de indices de municipio (-1 para desconhecido) e `areas`
+    uma matriz (N, C) de hectares por classe. Retorna vetores (N,) com total,
+    area valorada e ano de referencia (0 quando nao ha preco).
+    """
+    conhecido = t >= 0
+    seguro = np.where(conhecido, t, 0)
+    if ano is None:
+      precos = self.ultimo_preco[seguro]
+      anos = self.ultimo_ano[seguro]
+    else:
+      a = self.ano_idx.get(ano)
+      if a is None:
+        precos = np.full(areas.shape, np.nan)
+      else:
+        precos = self.precos[seguro, :, a]
+      anos = np.full(areas.shape, ano)
+    com_preco = ~np.isnan(precos) & conhecido[:, None]
+    total = (areas * np.where(com_preco, precos, 0.0)).sum(axis=1)
+    area_valorada = np.where(com_preco, areas, 0.0).sum(axis=1)
+    ano_ref = np.where(com_preco & (areas > 0), anos, 0).max(axis=1)
+    return total, area_valorada, ano_ref
@@ -0,0 +1,42 @@
+"""Provedor de busca falso para testes de carga, sem acesso a rede.
+
+Ative com `PRICE_SEARCH_PROVIDER=fake_provider:buscar`. A latencia simulada vem
+de `FAKE_SEARCH_LATENCY_MS` (padrao 50); `FAKE_SEARCH_EMPTY_RATE` (0 a 1) e a
+fracao de consultas que voltam vazias, para exercitar o fallback. Os resultados
+sao deterministicos por query.
+"""
+import hashlib
+import os
+import time
+
+LATENCIA_MS = float(os.environ.get("FAKE_SEARCH_LATENCY_MS", "50"))
+TAXA_VAZIA = float(os.environ.get("FAKE_SEARCH_EMPTY_RATE", "0"))
+
+MODELOS = [
+  ("Fazenda a venda em {m}", "Fazenda com {a} hectares, R$ {p},00 o hectare, imovel rural", "https://imoveis.example.com/{h}"),
+  ("Sitio em {m}", "Sitio a venda com {a} ha, otima localizacao", "https://sitios.example.com/{h}"),
+  ("{m} - Wikipedia", "Municipio brasileiro do estado do Parana", "https://pt.wikipedia.org/wiki/{h}"),
+  ("Restaurante em {m}", "Melhor restaurante da regiao", "https://guia.example.com/{h}"),
+  ("Chacara a venda {m}", "Chacara de {a} alqueires por R$ {p},00", "https://chacaras.example.com/{h}"),
+]
+
+
+def buscar(query, max_results):
+  if LATENCIA_MS:
+    time.sleep(LATENCIA_MS / 1000)
+
+  semente = int(hashlib.md5(query.encode("utf-8")).hexdigest(), 16)
+  if (semente % 1000) / 1000 < TAXA_VAZIA:
+    return []
+
+  municipio = query.split(" a venda ")[-1].split(" ")[0]
+  resultados = []
+  for i in range(max_results):
+    titulo, corpo, link = MODELOS[(semente + i) % len(MODELOS)]
+    valores = {"m": municipio, "a": 5 + (semente >> i) % 200, "p": 1000 + (semente >> (i + 3)) % 90000, "h": f"{semente % 10**8}-{i}"}
+    resultados.append({
+      "title": titulo.format(**valores),
+      "body": corpo.format(**valores),
+      "href": link.format(**valores),
+    })
+  return resultados
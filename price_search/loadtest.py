@@ -0,0 +1,234 @@
+"""Teste de carga reproduzivel da API, com provedor de busca falso.
+
+Sobe a app em processo (httpx + ASGI) ou sob uvicorn, dispara requisicoes com
+concorrencia e mistura de rotas configuraveis e grava throughput e latencias
+p50/p95/p99 em JSON, para comparar execucoes.
+
+Uso:
+  python loadtest.py --requisicoes 500 --concorrencia 20
+  python loadtest.py --modo uvicorn --mix search=0.6,estimate=0.3,prices=0.1 \\
+    --repetidos 0.8 --saida resultados/loadtest.json
+
+Requer `httpx` (python -m pip install httpx).
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+DIR = os.path.dirname(os.path.abspath(__file__))
+AGGREGATED_PATH = os.path.join(os.path.dirname(DIR), "dashboard", "public", "data", "aggregated.json")
+
+CLASSES = ["A-I", "A-II", "A-III", "A-IV", "B-V", "B-VI", "B-VII", "C-VIII"]
+MUNICIPIOS_PADRAO = ["Cascavel", "Londrina", "Maringa", "Ponta Grossa", "Guarapuava", "Toledo", "Umuarama"]
+ROTAS = ["search", "estimate", "prices"]
+
+
+def carregar_municipios():
+  try:
+    with open(AGGREGATED_PATH, "r", encoding="utf-8") as handle:
+      municipios = json.load(handle)["metadata"]["territorios"].get("Municipio", [])
+  except (FileNotFoundError, KeyError, ValueError):
+    municipios = []
+  return municipios or MUNICIPIOS_PADRAO
+
+
+def parse_mix(texto):
+  pesos = {}
+  for parte in texto.split(","):
+    rota, _, peso = parte.partition("=")
+    rota = rota.strip()
+    if rota not in ROTAS:
+      raise SystemExit(f"Rota desconhecida no --mix: {rota} (use {', '.join(ROTAS)})")
+    pesos[rota] = float(peso or 1)
+  return pesos
+
+
+class GeradorRequisicoes:
+  """Sorteia requisicoes de forma reproduzivel (mesma semente, mesma sequencia).
+
+  `repetidos` e a fracao de requisicoes que reutiliza um conjunto pequeno de
+  municipios/areas fixos (o que um cache aproveitaria); o resto usa municipio e
+  areas aleatorios.
+  """
+
+  def __init__(self, municipios, mix, repetidos, seed):
+    self.rng = random.Random(seed)
+    self.municipios = municipios
+    self.rotas = list(mix)
+    self.pesos = [mix[rota] for rota in self.rotas]
+    self.repetidos = repetidos
+    quentes = self.rng.sample(municipios, min(5, len(municipios)))
+    self.quentes = [(municipio, self._areas()) for municipio in quentes]
+
+  def _areas(self):
+    classes = self.rng.sample(CLASSES, self.rng.randint(1, 4))
+    return {classe: round(self.rng.uniform(1, 200), 2) for classe in classes}
+
+  def proxima(self):
+    rota = self.rng.choices(self.rotas, weights=self.pesos)[0]
+    if self.rng.random() < self.repetidos:
+      municipio, areas = self.rng.choice(self.quentes)
+    else:
+      municipio, areas = self.rng.choice(self.municipios), self._areas()
+
+    if rota == "prices":
+      ano_min = self.rng.randint(1998, 2020)
+      return rota, "GET", "/api/prices", {"params": {"territorios": municipio, "ano_min": ano_min, "agregados": "true"}}
+    payload = {"municipio": municipio, "areas": areas, "area_total": sum(areas.values())}
+    caminho = "/api/search" if rota == "search" else "/api/estimate"
+    return rota, "POST", caminho, {"json": payload}
+
+
+def percentil(ordenados, p):
+  if not ordenados:
+    return None
+  # Nearest rank: menor valor com pelo menos p% das amostras ate ele.
+  k = max(0, min(len(ordenados) - 1, math.ceil(p / 100 * len(ordenados)) - 1))
+  return ordenados[k]
+
+
+def resumir(amostras, segundos):
+  latencias = sorted(amostra["ms"] for amostra in amostras)
+  erros = sum(1 for amostra in amostras if amostra["status"] is None or amostra["status"] >= 400)
+  return {
+    "requisicoes": len(amostras),
+    "erros": erros,
+    "throughput_rps": round(len(amostras) / segundos, 2) if segundos else None,
+    "p50_ms": percentil(latencias, 50),
+    "p95_ms": percentil(latencias, 95),
+    "p99_ms": percentil(latencias, 99),
+    "max_ms": latencias[-1] if latencias else None,
+    "media_ms": round(sum(latencias) / len(latencias), 2) if latencias else None,
+  }
+
+
+async def executar(cliente, gerador, total, concorrencia):
+  amostras = []
+  restantes = iter(range(total))
+
+  async def trabalhador():
+    for _ in restantes:
+      rota, metodo, caminho, kwargs = gerador.proxima()
+      inicio = time.perf_counter()
+      try:
+        resposta = await cliente.request(metodo, caminho, **kwargs)
+        status = resposta.status_code
+      except httpx.HTTPError:
+        status = None
+      amostras.append({"rota": rota, "status": status, "ms": round((time.perf_counter() - inicio) * 1000, 3)})
+
+  inicio = time.perf_counter()
+  await asyncio.gather(*(trabalhador() for _ in range(concorrencia)))
+  return amostras, time.perf_counter() - inicio
+
+
+async def aguardar_pronto(cliente, timeout=120):
+  limite = time.perf_counter() + timeout
+  while time.perf_counter() < limite:
+    try:
+      if (await cliente.get("/ready")).status_code == 200:
+        return
+    except httpx.HTTPError:
+      pass
+    await asyncio.sleep(0.05)
+  raise SystemExit("A API nao ficou pronta a tempo (/ready).")
+
+
+async def rodar_em_processo(args, gerador):
+  import app
+
+  async with app.app.router.lifespan_context(app.app):
+    transporte = httpx.ASGITransport(app=app.app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://loadtest", timeout=args.timeout) as cliente:
+      await aguardar_pronto(cliente)
+      return await executar(cliente, gerador, args.requisicoes, args.concorrencia)
+
+
+def porta_livre():
+  with socket.socket() as sock:
+    sock.bind(("127.0.0.1", 0))
+    return sock.getsockname()[1]
+
+
+async def rodar_uvicorn(args, gerador):
+  porta = porta_livre()
+  processo = subprocess.Popen(
+    [sys.executable, "-m", "uvicorn", "app:app", "--port", str(porta), "--log-level", "warning",
+     "--workers", str(args.workers)],
+    cwd=DIR, env=os.environ.copy(),
+  )
+  try:
+    limites = httpx.Limits(max_connections=args.concorrencia)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{porta}", timeout=args.timeout, limits=limites) as cliente:
+      await aguardar_pronto(cliente)
+      return await executar(cliente, gerador, args.requisicoes, args.concorrencia)
+  finally:
+    processo.terminate()
+    processo.wait()
+
+
+def commit_atual():
+  try:
+    return subprocess.run(
+      ["git", "rev-parse", "--short", "HEAD"], cwd=DIR, capture_output=True, text=True, check=True,
+    ).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--modo", choices=["processo", "uvicorn"], default="processo")
+  parser.add_argument("--requisicoes", type=int, default=300)
+  parser.add_argument("--concorrencia", type=int, default=10)
+  parser.add_argument("--mix", default="search=1", help="pesos por rota, ex.: search=0.6,estimate=0.3,prices=0.1")
+  parser.add_argument("--repetidos", type=float, default=0.5, help="fracao de requisicoes com municipio/areas repetidos")
+  parser.add_argument("--latencia-fake-ms", type=float, default=50, help="latencia do provedor falso")
+  parser.add_argument("--vazias-fake", type=float, default=0.0, help="fracao de consultas vazias no provedor falso")
+  parser.add_argument("--workers", type=int, default=1, help="workers do uvicorn (modo uvicorn)")
+  parser.add_argument("--timeout", type=float, default=30)
+  parser.add_argument("--seed", type=int, default=42)
+  parser.add_argument("--saida", default="loadtest.json")
+  args = parser.parse_args()
+
+  # O provedor falso le estas variaveis ao ser importado (inclusive no uvicorn).
+  os.environ["PRICE_SEARCH_PROVIDER"] = "fake_provider:buscar"
+  os.environ["FAKE_SEARCH_LATENCY_MS"] = str(args.latencia_fake_ms)
+  os.environ["FAKE_SEARCH_EMPTY_RATE"] = str(args.vazias_fake)
+
+  mix = parse_mix(args.mix)
+  gerador = GeradorRequisicoes(carregar_municipios(), mix, args.repetidos, args.seed)
+  rodar = rodar_uvicorn if args.modo == "uvicorn" else rodar_em_processo
+  amostras, segundos = asyncio.run(rodar(args, gerador))
+
+  resultado = {
+    "timestamp": datetime.now(timezone.utc).isoformat(),
+    "commit": commit_atual(),
+    "config": {chave: valor for chave, valor in vars(args).items() if chave != "saida"},
+    "duracao_s": round(segundos, 3),
+    "geral": resumir(amostras, segundos),
+    "por_rota": {
+      rota: resumir([amostra for amostra in amostras if amostra["rota"] == rota], segundos)
+      for rota in mix
+    },
+  }
+
+  pasta = os.path.dirname(os.path.abspath(args.saida))
+  os.makedirs(pasta, exist_ok=True)
+  with open(args.saida, "w", encoding="utf-8") as handle:
+    json.dump(resultado, handle, ensure_ascii=False, indent=2)
+  print(json.dumps(resultado["geral"]))
+
+
+if __name__ == "__main__":
+  main()
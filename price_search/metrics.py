@@ -0,0 +1,83 @@
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+REQUEST_LATENCY = Histogram(
+  "price_search_request_seconds",
+  "Latencia ponta a ponta das requisicoes HTTP",
+  ["method", "path", "status"],
+)
+
+UPSTREAM_LATENCY = Histogram(
+  "price_search_upstream_query_seconds",
+  "Latencia de cada consulta ao provedor de busca",
+  ["nivel", "resultado"],
+  buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32),
+)
+
+QUERIES = Counter(
+  "price_search_queries_total",
+  "Consultas ao provedor por nivel de fallback (1 = query com classes)",
+  ["nivel", "resultado"],
+)
+
+RESULTADOS_FILTRADOS = Counter(
+  "price_search_results_filtered_total",
+  "Resultados brutos descartados pelos filtros",
+  ["motivo"],
+)
+
+ANUNCIOS = Counter(
+  "price_search_listings_total",
+  "Anuncios devolvidos pelo /api/search",
+)
+
+BUSCAS_VAZIAS = Counter(
+  "price_search_empty_searches_total",
+  "Buscas que terminaram sem nenhum anuncio",
+  ["etapa"],
+)
+
+NAO_MODIFICADOS = Counter(
+  "price_search_not_modified_total",
+  "Respostas 304 servidas por revalidacao de ETag",
+  ["path"],
+)
+
+
+def resposta_metricas():
+  return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+  """Middleware ASGI que mede a latencia ate o ultimo byte da resposta.
+
+  O rotulo `path` so usa caminhos de rotas conhecidas para manter a
+  cardinalidade baixa; o resto vira "outro".
+  """
+
+  def __init__(self, app):
+    self.app = app
+    self.caminhos = None
+
+  async def __call__(self, scope, receive, send):
+    if scope["type"] != "http":
+      await self.app(scope, receive, send)
+      return
+
+    if self.caminhos is None:
+      self.caminhos = {getattr(route, "path", None) for route in scope["app"].routes}
+
+    inicio = time.perf_counter()
+    status = {"codigo": 500}
+
+    async def send_medido(message):
+      if message["type"] == "http.response.start":
+        status["codigo"] = message["status"]
+      await send(message)
+
+    try:
+      await self.app(scope, receive, send_medido)
+    finally:
+      path = scope["path"] if scope["path"] in self.caminhos else "outro"
+      REQUEST_LATENCY.labels(scope["method"], path, str(status["codigo"])).observe(time.perf_counter() - inicio)
@@ -0,0 +1,235 @@
+import hashlib
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Dimensoes filtraveis (nome do filtro -> coluna do registro).
+DIMENSOES = {
+  "niveis": "nivel",
+  "regioes": "regiao",
+  "mesorregioes": "mesorregiao",
+  "territorios": "territorio",
+  "categorias": "categoria",
+  "subcategorias": "subcategoria",
+}
+
+COLUNAS_TEXTO = ["nivel", "territorio", "territorio_codigo", "regiao", "mesorregiao", "categoria", "subcategoria", "unidade"]
+
+
+def _estatisticas_por_grupo(grupos, precos, n_grupos):
+  """Media, mediana, min, max e contagem de `precos` por codigo de grupo (vetorizado)."""
+  validos = ~np.isnan(precos)
+  registros = np.bincount(grupos, minlength=n_grupos)
+  grupos, precos = grupos[validos], precos[validos]
+  n = np.bincount(grupos, minlength=n_grupos)
+  soma = np.bincount(grupos, weights=precos, minlength=n_grupos)
+  soma_q = np.bincount(grupos, weights=precos * precos, minlength=n_grupos)
+
+  ordem = np.lexsort((precos, grupos))
+  ordenados = precos[ordem]
+  inicio = np.concatenate(([0], np.cumsum(n)[:-1]))
+  com_dados = n > 0
+  inicio_v, n_v = inicio[com_dados], n[com_dados]
+
+  media = np.zeros(n_grupos)
+  mediana = np.zeros(n_grupos)
+  minimo = np.zeros(n_grupos)
+  maximo = np.zeros(n_grupos)
+  desvio = np.zeros(n_grupos)
+  if len(ordenados):
+    media[com_dados] = soma[com_dados] / n_v
+    mediana[com_dados] = (ordenados[inicio_v + (n_v - 1) // 2] + ordenados[inicio_v + n_v // 2]) / 2
+    minimo[com_dados] = ordenados[inicio_v]
+    maximo[com_dados] = ordenados[inicio_v + n_v - 1]
+    desvio[com_dados] = np.sqrt(np.maximum(soma_q[com_dados] / n_v - media[com_dados] ** 2, 0.0))
+  return {
+    "media": media,
+    "mediana": mediana,
+    "min": minimo,
+    "max": maximo,
+    "desvio": desvio,
+    "registros": registros,
+  }
+
+
+def _linha_stats(stats, i):
+  return {chave: (int(valores[i]) if chave == "registros" else float(valores[i])) for chave, valores in stats.items()}
+
+
+class PrecoStore:
+  """Armazenamento colunar dos registros DERAL com bitmaps por valor de dimensao.
+
+  Cada coluna de texto vira um vetor de codigos + vocabulario. Para cada valor de
+  cada dimensao (e para cada ano) ha um bitmap compactado (`np.packbits`) com as
+  linhas que o contem; um filtro e o OU dos bitmaps dentro da dimensao e o E
+  entre dimensoes.
+  """
+
+  def __init__(self, registros):
+    registros = [row for row in registros if row.get("ano")]
+    registros.sort(key=lambda row: int(row["ano"]))
+    n = len(registros)
+    self.n = n
+
+    self.ano = np.fromiter((int(row["ano"]) for row in registros), dtype=np.int32, count=n)
+    self.preco = np.fromiter(
+      (np.nan if row.get("preco") is None else float(row["preco"]) for row in registros),
+      dtype=np.float64, count=n,
+    )
+
+    self.codigos = {}
+    self.vocab = {}
+    for coluna in COLUNAS_TEXTO:
+      valores = [row.get(coluna) or "" for row in registros]
+      vocab = sorted(set(valores))
+      posicao = {valor: codigo for codigo, valor in enumerate(vocab)}
+      self.vocab[coluna] = vocab
+      self.codigos[coluna] = np.fromiter((posicao[valor] for valor in valores), dtype=np.int32, count=n)
+
+    self.bitmaps = {
+      filtro: {
+        valor: np.packbits(self.codigos[coluna] == codigo)
+        for codigo, valor in enumerate(self.vocab[coluna]) if valor
+      }
+      for filtro, coluna in DIMENSOES.items()
+    }
+    self.anos = sorted(set(self.ano.tolist()))
+    self.bitmaps_ano = {
+      ano: np.packbits(self.ano == ano) for ano in self.anos
+    }
+    self._vazio = np.packbits(np.zeros(n, dtype=bool))
+    self._cheio = np.packbits(np.ones(n, dtype=bool))
+
+    hasher = hashlib.sha1()
+    hasher.update(self.ano.tobytes())
+    hasher.update(self.preco.tobytes())
+    for coluna in COLUNAS_TEXTO:
+      hasher.update(self.codigos[coluna].tobytes())
+      hasher.update("\x1f".join(self.vocab[coluna]).encode("utf-8"))
+    self.versao = hasher.hexdigest()[:16]
+
+    logger.info("Store de precos carregado: %d registros, versao %s", n, self.versao)
+
+  def __len__(self):
+    return self.n
+
+  def _uniao(self, bitmaps, valores):
+    resultado = self._vazio.copy()
+    for valor in valores:
+      bitmap = bitmaps.get(valor)
+      if bitmap is not None:
+        np.bitwise_or(resultado, bitmap, out=resultado)
+    return resultado
+
+  def filtrar(self, ano_min=None, ano_max=None, **filtros):
+    """Indices (ordenados por ano) das linhas que satisfazem todos os filtros."""
+    resultado = self._cheio.copy()
+    if ano_min or ano_max:
+      anos = [ano for ano in self.anos if (not ano_min or ano >= ano_min) and (not ano_max or ano <= ano_max)]
+      np.bitwise_and(resultado, self._uniao(self.bitmaps_ano, anos), out=resultado)
+    for filtro, valores in filtros.items():
+      if not valores:
+        continue
+      np.bitwise_and(resultado, self._uniao(self.bitmaps[filtro], valores), out=resultado)
+    return np.flatnonzero(np.unpackbits(resultado, count=self.n))
+
+  def linhas(self, indices):
+    saida = []
+    for i in indices:
+      row = {"ano": int(self.ano[i])}
+      for coluna in COLUNAS_TEXTO:
+        row[coluna] = self.vocab[coluna][self.codigos[coluna][i]]
+      preco = self.preco[i]
+      row["preco"] = None if np.isnan(preco) else float(preco)
+      saida.append(row)
+    return saida
+
+  def _grupos(self, coluna, indices):
+    """Codigos distintos de `coluna` em `indices`, o grupo de cada linha e a primeira linha de cada grupo."""
+    codigos, primeira, inverso = np.unique(self.codigos[coluna][indices], return_index=True, return_inverse=True)
+    return codigos, inverso.reshape(-1), indices[primeira]
+
+  def _valor(self, coluna, i, padrao=""):
+    return self.vocab[coluna][self.codigos[coluna][i]] or padrao
+
+  def agregados(self, indices):
+    """Estatisticas no formato de `useAggregations` do dashboard."""
+    indices = np.asarray(indices, dtype=np.intp)
+    precos = self.preco[indices]
+    geral = _estatisticas_por_grupo(np.zeros(len(indices), dtype=np.intp), precos, 1)
+    resposta = {
+      "totalRegistros": int(len(indices)),
+      "precoMedio": float(geral["media"][0]),
+      "precoMediana": float(geral["mediana"][0]),
+      "precoMin": float(geral["min"][0]),
+      "precoMax": float(geral["max"][0]),
+      "volatilidade": float(geral["desvio"][0]),
+    }
+
+    anos, codigos_ano = np.unique(self.ano[indices], return_inverse=True)
+    codigos_ano = codigos_ano.reshape(-1)
+    stats = _estatisticas_por_grupo(codigos_ano, precos, len(anos))
+    serie = [{"ano": int(ano), **_linha_stats(stats, i)} for i, ano in enumerate(anos)]
+    resposta["timeSeries"] = serie
+
+    # CAGR entre a media do primeiro e do ultimo ano, como no dashboard.
+    cagr = 0.0
+    if len(serie) >= 2 and serie[0]["media"] > 0 and serie[-1]["media"] > 0:
+      cagr = (serie[-1]["media"] / serie[0]["media"]) ** (1 / (len(serie) - 1)) - 1
+    resposta["cagr"] = cagr
+
+    codigos, grupo, primeira = self._grupos("categoria", indices)
+    stats = _estatisticas_por_grupo(grupo, precos, len(codigos))
+    resposta["byCategoria"] = sorted(
+      (
+        {"categoria": self._valor("categoria", linha, "Sem categoria"), **_linha_stats(stats, i)}
+        for i, linha in enumerate(primeira)
+      ),
+      key=lambda item: item["media"], reverse=True,
+    )
+
+    codigos, grupo, primeira = self._grupos("subcategoria", indices)
+    stats = _estatisticas_por_grupo(grupo, precos, len(codigos))
+    resposta["bySubcategoria"] = sorted(
+      (
+        {
+          "subcategoria": self._valor("subcategoria", linha, "Sem subcategoria"),
+          "categoria": self._valor("categoria", linha),
+          **_linha_stats(stats, i),
+        }
+        for i, linha in enumerate(primeira)
+      ),
+      key=lambda item: item["subcategoria"],
+    )
+
+    # Serie anual por subcategoria: grupo combinado (subcategoria, ano).
+    combinado = grupo * len(anos) + codigos_ano
+    stats = _estatisticas_por_grupo(combinado, precos, len(codigos) * len(anos))
+    por_subcategoria = {}
+    for i, linha in enumerate(primeira):
+      subcategoria = self._valor("subcategoria", linha)
+      if not subcategoria:
+        continue
+      por_subcategoria[subcategoria] = [
+        {"ano": int(ano), **_linha_stats(stats, i * len(anos) + j)}
+        for j, ano in enumerate(anos) if stats["registros"][i * len(anos) + j]
+      ]
+    resposta["timeSeriesBySubcategoria"] = por_subcategoria
+
+    codigos, grupo, primeira = self._grupos("territorio", indices)
+    stats = _estatisticas_por_grupo(grupo, precos, len(codigos))
+    resposta["byTerritorio"] = sorted(
+      (
+        {
+          "territorio": self._valor("territorio", linha, "Sem territorio"),
+          "codigo": self._valor("territorio_codigo", linha) or None,
+          "nivel": self._valor("nivel", linha),
+          **_linha_stats(stats, i),
+        }
+        for i, linha in enumerate(primeira)
+      ),
+      key=lambda item: item["media"], reverse=True,
+    )
+    return resposta
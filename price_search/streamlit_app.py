@@ -0,0 +1,57 @@
+import json
+
+from busca import buscar_anuncios
+
+
+def carregar_municipios(caminho="municipios.json"):
+  try:
+    with open(caminho, "r", encoding="utf-8") as handle:
+      return json.load(handle)
+  except FileNotFoundError:
+    return []
+
+
+def main():
+  import streamlit as st
+
+  st.title("Pesquisa de Preco de Terras")
+  st.write("Selecione o municipio e informe as areas em ha para cada classe.")
+
+  municipios = carregar_municipios()
+  if municipios:
+    municipio = st.selectbox("Municipio", options=municipios)
+  else:
+    st.warning("municipios.json nao encontrado. Informe manualmente.")
+    municipio = st.text_input("Municipio")
+
+  areas = {}
+  total_area = 0.0
+
+  col1, col2 = st.columns(2)
+  with col1:
+    for classe in ["A-I", "A-II", "A-III", "A-IV"]:
+      valor = st.number_input(f"{classe} (ha)", min_value=0.0, step=0.01)
+      areas[classe] = valor
+      total_area += valor
+  with col2:
+    for classe in ["B-V", "B-VI", "B-VII", "C-VIII"]:
+      valor = st.number_input(f"{classe} (ha)", min_value=0.0, step=0.01)
+      areas[classe] = valor
+      total_area += valor
+
+  st.write(f"**Total:** {total_area:.2f} ha")
+
+  if st.button("Pesquisar") and municipio and total_area > 0:
+    with st.spinner("Buscando propriedades..."):
+      resultados = buscar_anuncios(municipio, total_area, areas)
+
+    st.success(f"Foram encontrados {len(resultados)} anuncios.")
+    for item in resultados:
+      st.markdown(f"* **{item['titulo']}** - {item['preco'] or 'sem preco'}")
+      if item.get("link"):
+        st.markdown(f"  <{item['link']}>", unsafe_allow_html=True)
+      st.markdown("---")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,147 @@
+"""Cache do texto das paginas dos PDFs, para nao repetir `extract_text()`.
+
+Cada PDF vira um arquivo `data/.page_text/<sha256 do PDF>.pages`:
+
+    cabecalho  MAGIC, versao do extrator (tamanho + bytes), numero de paginas
+    offsets    n + 1 inteiros uint64 (inicio de cada pagina no arquivo)
+    paginas    texto de cada pagina em UTF-8 comprimido com zlib
+
+O arquivo e lido via mmap e so a pagina pedida e descomprimida. Como a chave e
+o hash do conteudo, renomear um PDF nao invalida o cache e trocar o PDF gera
+outro arquivo; mudar a versao do pypdf tambem forca nova extracao.
+"""
+import hashlib
+import mmap
+import os
+import struct
+import zlib
+
+import pypdf
+from pypdf import PdfReader
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.path.join(BASE_DIR, 'data', '.page_text')
+
+MAGIC = b'PGTXT\x00\x01\x00'
+EXTRACTOR = f'pypdf {pypdf.__version__}'.encode('utf-8')
+COMPRESSION_LEVEL = 6
+
+
+def file_digest(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(1 << 20), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def write_pages(path, texts):
+    blobs = [zlib.compress(text.encode('utf-8'), COMPRESSION_LEVEL) for text in texts]
+    header = MAGIC + struct.pack('<H', len(EXTRACTOR)) + EXTRACTOR + struct.pack('<I', len(blobs))
+    offsets = [len(header) + 8 * (len(blobs) + 1)]
+    for blob in blobs:
+        offsets.append(offsets[-1] + len(blob))
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as handle:
+        handle.write(header)
+        handle.write(struct.pack(f'<{len(offsets)}Q', *offsets))
+        for blob in blobs:
+            handle.write(blob)
+    os.replace(tmp_path, path)
+
+
+class PageTextStore:
+    """Texto das paginas de um PDF, lido sob demanda de um arquivo mapeado em memoria."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as handle:
+            self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._read_header()
+        except (ValueError, struct.error) as exc:
+            self.close()
+            raise ValueError(f'Cache de paginas invalido: {path}') from exc
+
+    def _read_header(self):
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError('magic')
+        position = len(MAGIC)
+        (size,) = struct.unpack_from('<H', self._map, position)
+        position += 2
+        self.extractor = bytes(self._map[position:position + size])
+        position += size
+        (self.n_pages,) = struct.unpack_from('<I', self._map, position)
+        position += 4
+        # n_pages corrompido: a tabela de offsets nao caberia no arquivo.
+        if position + 8 * (self.n_pages + 1) > len(self._map):
+            raise ValueError('tabela de offsets')
+        self._offsets = struct.unpack_from(f'<{self.n_pages + 1}Q', self._map, position)
+        position += 8 * (self.n_pages + 1)
+        # Arquivo truncado ou offsets corrompidos: a ultima pagina precisa
+        # terminar exatamente no fim do arquivo.
+        ordenados = all(a <= b for a, b in zip(self._offsets, self._offsets[1:]))
+        if self._offsets[0] != position or self._offsets[-1] != len(self._map) or not ordenados:
+            raise ValueError('offsets')
+
+    def __len__(self):
+        return self.n_pages
+
+    def __getitem__(self, index):
+        if not -self.n_pages <= index < self.n_pages:
+            raise IndexError(index)
+        index %= self.n_pages
+        start, end = self._offsets[index], self._offsets[index + 1]
+        return zlib.decompress(self._map[start:end]).decode('utf-8')
+
+    def __iter__(self):
+        for index in range(self.n_pages):
+            yield self[index]
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_pages(pdf_path, cache_dir=CACHE_DIR, refresh=False):
+    """Abre o cache de paginas do PDF, extraindo o texto com pypdf se faltar.
+
+    Devolve `(store, extraido)`; `extraido` indica se houve extracao agora.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f'{file_digest(pdf_path)}.pages')
+    if os.path.exists(path) and not refresh:
+        try:
+            store = PageTextStore(path)
+        except (ValueError, struct.error):
+            store = None
+        if store is not None and store.extractor == EXTRACTOR:
+            return store, False
+        if store is not None:
+            store.close()
+
+    reader = PdfReader(pdf_path)
+    write_pages(path, [page.extract_text() or '' for page in reader.pages])
+    return PageTextStore(path), True
+
+
+def read_pages(pdf_path, cache_dir=CACHE_DIR):
+    """Texto de todas as paginas do PDF, via cache. Devolve `(textos, extraido)`.
+
+    Uma pagina que nao descomprime (arquivo corrompido com cabecalho valido)
+    descarta o cache do PDF e extrai tudo de novo.
+    """
+    store, extracted = open_pages(pdf_path, cache_dir)
+    try:
+        with store:
+            return list(store), extracted
+    except (zlib.error, UnicodeDecodeError):
+        pass
+    store, extracted = open_pages(pdf_path, cache_dir, refresh=True)
+    with store:
+        return list(store), extracted
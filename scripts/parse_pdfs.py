@@ -1,11 +1,15 @@
-﻿import csv
+﻿import argparse
+import csv
 import os
 import re
+import time
 import unicodedata
 from glob import glob
 
 from pypdf import PdfReader
 
+from page_text_cache import read_pages
+
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 PDF_DIR = os.path.join(BASE_DIR, 'data')
@@ -228,26 +232,47 @@ def parse_single_year(text, year):
 
 
 def main():
+    parser = argparse.ArgumentParser(description='Le o texto dos PDFs com pypdf e gera compiled.csv.')
+    parser.add_argument(
+        '--sem-cache',
+        action='store_true',
+        help='extrai o texto de todas as paginas de novo, sem ler/gravar data/.page_text',
+    )
+    args = parser.parse_args()
+
     os.makedirs(OUT_DIR, exist_ok=True)
     pdf_files = sorted(glob(os.path.join(PDF_DIR, '*.pdf')))
     if not pdf_files:
         raise SystemExit('Nenhum PDF encontrado em data/.')
 
     all_rows = []
+    extract_seconds = parse_seconds = 0.0
+    extracted = 0
 
     for pdf_path in pdf_files:
-        reader = PdfReader(pdf_path)
         filename = os.path.basename(pdf_path)
         year_hint = parse_year_from_filename(filename)
         format_type = None
-        for page in reader.pages:
-            text = page.extract_text() or ''
+
+        start = time.perf_counter()
+        if args.sem_cache:
+            reader = PdfReader(pdf_path)
+            texts = [page.extract_text() or '' for page in reader.pages]
+            extracted += 1
+        else:
+            texts, fresh = read_pages(pdf_path)
+            extracted += fresh
+        extract_seconds += time.perf_counter() - start
+
+        start = time.perf_counter()
+        for text in texts:
             if format_type is None:
                 format_type = detect_format(text)
             if format_type == 'multi_year':
                 all_rows.extend(parse_multi_year(text))
             elif format_type == 'single_year' and year_hint:
                 all_rows.extend(parse_single_year(text, year_hint))
+        parse_seconds += time.perf_counter() - start
 
     with open(OUT_FILE, 'w', encoding='utf-8', newline='') as handle:
         writer = csv.DictWriter(handle, fieldnames=[
@@ -265,6 +290,11 @@ def main():
         writer.writerows(all_rows)
 
     print(f'Arquivo gerado: {OUT_FILE} ({len(all_rows)} registros)')
+    print(
+        f'Texto das paginas: {extract_seconds:.2f}s '
+        f'({extracted}/{len(pdf_files)} PDFs extraidos, resto do cache); '
+        f'parsing: {parse_seconds:.2f}s'
+    )
 
 
 if __name__ == '__main__':
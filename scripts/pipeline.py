@@ -0,0 +1,264 @@
+"""Pipeline de dados: extract -> parse -> preprocess -> geo.
+
+Cada estagio declara entradas, saidas e o codigo que o executa. Entradas e
+saidas sao identificadas pelo hash do conteudo; um estagio so roda de novo se
+uma entrada, o proprio codigo ou uma saida mudou. Estagios independentes
+(ex.: extract com tabula e parse com pypdf) rodam em paralelo.
+
+O estagio `extract` (tabula, requer Java) e opcional: nenhum outro estagio usa
+as saidas dele, entao fica fora do alvo padrao e so roda quando pedido pelo
+nome. Como qualquer lista de estagios, `extract` sozinho roda so ele; para
+reconstruir tudo com tabula e pypdf em paralelo, liste todos os estagios.
+
+Uso:
+    python scripts/pipeline.py                 # roda o que estiver desatualizado
+    python scripts/pipeline.py extract         # so as tabelas do tabula
+    python scripts/pipeline.py extract parse preprocess geo  # tudo, com tabula
+    python scripts/pipeline.py preprocess      # so o estagio e suas dependencias
+    python scripts/pipeline.py --forcar parse  # ignora o cache do estagio
+    python scripts/pipeline.py --listar
+"""
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from glob import glob
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS_DIR = os.path.join(BASE_DIR, 'scripts')
+DATA_DIR = os.path.join(BASE_DIR, 'data')
+DASHBOARD_DATA_DIR = os.path.join(BASE_DIR, 'dashboard', 'public', 'data')
+STATE_PATH = os.path.join(DATA_DIR, '.pipeline_state.json')
+
+MUN_PR_PATH = os.path.join(DATA_DIR, 'mun_PR.json')
+GEOJSON_PATH = os.path.join(DASHBOARD_DATA_DIR, 'territorios.geojson')
+
+
+def copiar_geojson():
+    with open(MUN_PR_PATH, encoding='utf-8') as handle:
+        geojson = json.load(handle)
+    os.makedirs(DASHBOARD_DATA_DIR, exist_ok=True)
+    with open(GEOJSON_PATH, 'w', encoding='utf-8') as handle:
+        json.dump(geojson, handle, ensure_ascii=False)
+
+
+# Entradas e saidas sao padroes glob relativos a BASE_DIR.
+STAGES = {
+    'extract': {
+        'descricao': 'Extrai tabelas dos PDFs com tabula',
+        'depende': [],
+        'opcional': True,
+        'entradas': ['data/*.pdf'],
+        'codigo': ['scripts/extract_pdfs.py'],
+        'saidas': ['data/extracted/*_lattice_*.csv', 'data/extracted/*_stream_*.csv'],
+        'script': 'extract_pdfs.py',
+    },
+    'parse': {
+        'descricao': 'Le o texto dos PDFs com pypdf e gera compiled.csv',
+        'depende': [],
+        'entradas': ['data/*.pdf'],
+        'codigo': ['scripts/parse_pdfs.py', 'scripts/page_text_cache.py'],
+        'saidas': ['data/extracted/compiled.csv'],
+        'script': 'parse_pdfs.py',
+    },
+    'preprocess': {
+        'descricao': 'Gera detailed.json e aggregated.json para o dashboard',
+        'depende': ['parse'],
+        'entradas': ['data/extracted/compiled.csv', 'data/mun_PR.json'],
+        'codigo': ['scripts/preprocess_data.py'],
+        'saidas': [
+            'dashboard/public/data/detailed.json',
+            'dashboard/public/data/aggregated.json',
+            'data/anomalias_precos.csv',
+        ],
+        'script': 'preprocess_data.py',
+    },
+    'geo': {
+        'descricao': 'Copia a malha de municipios para o dashboard',
+        'depende': [],
+        'entradas': ['data/mun_PR.json'],
+        'codigo': ['scripts/pipeline.py'],
+        'saidas': ['dashboard/public/data/territorios.geojson'],
+        'funcao': copiar_geojson,
+    },
+}
+
+
+class Fingerprints:
+    """Hash sha256 de arquivos, reaproveitado enquanto tamanho e mtime nao mudam."""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def arquivo(self, relativo):
+        caminho = os.path.join(BASE_DIR, relativo)
+        stat = os.stat(caminho)
+        chave = [stat.st_size, stat.st_mtime_ns]
+        salvo = self.cache.get(relativo)
+        if salvo and salvo[:2] == chave:
+            return salvo[2]
+        hasher = hashlib.sha256()
+        with open(caminho, 'rb') as handle:
+            for bloco in iter(lambda: handle.read(1 << 20), b''):
+                hasher.update(bloco)
+        digest = hasher.hexdigest()
+        self.cache[relativo] = chave + [digest]
+        return digest
+
+    def padroes(self, padroes):
+        arquivos = {}
+        for padrao in padroes:
+            for caminho in sorted(glob(os.path.join(BASE_DIR, padrao))):
+                relativo = os.path.relpath(caminho, BASE_DIR).replace(os.sep, '/')
+                arquivos[relativo] = self.arquivo(relativo)
+        return arquivos
+
+
+def chave_estagio(fingerprints, stage):
+    entradas = fingerprints.padroes(stage['entradas'])
+    codigo = fingerprints.padroes(stage['codigo'])
+    hasher = hashlib.sha256()
+    hasher.update(json.dumps([entradas, codigo], sort_keys=True).encode('utf-8'))
+    return hasher.hexdigest()
+
+
+def carregar_estado():
+    try:
+        with open(STATE_PATH, encoding='utf-8') as handle:
+            return json.load(handle)
+    except (FileNotFoundError, ValueError):
+        return {'arquivos': {}, 'estagios': {}}
+
+
+def salvar_estado(estado):
+    tmp_path = f'{STATE_PATH}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as handle:
+        json.dump(estado, handle, indent=2, sort_keys=True)
+    os.replace(tmp_path, STATE_PATH)
+
+
+def esta_atualizado(fingerprints, nome, chave, estado):
+    anterior = estado['estagios'].get(nome)
+    if not anterior or anterior.get('chave') != chave:
+        return False
+    saidas = fingerprints.padroes(STAGES[nome]['saidas'])
+    return bool(saidas) and saidas == anterior.get('saidas')
+
+
+def executar_estagio(nome):
+    stage = STAGES[nome]
+    inicio = time.perf_counter()
+    if 'funcao' in stage:
+        stage['funcao']()
+    else:
+        subprocess.run(
+            [sys.executable, os.path.join(SCRIPTS_DIR, stage['script'])],
+            cwd=BASE_DIR,
+            check=True,
+        )
+    return time.perf_counter() - inicio
+
+
+def com_dependencias(nomes):
+    selecionados = set()
+    pendentes = list(nomes)
+    while pendentes:
+        nome = pendentes.pop()
+        if nome in selecionados:
+            continue
+        selecionados.add(nome)
+        pendentes.extend(STAGES[nome]['depende'])
+    return [nome for nome in STAGES if nome in selecionados]
+
+
+def rodar(nomes, forcar=(), jobs=None):
+    estado = carregar_estado()
+    fingerprints = Fingerprints(estado['arquivos'])
+    concluidos, falhas = set(), set()
+    pendentes = list(nomes)
+    em_execucao = {}
+
+    def prontos():
+        for nome in list(pendentes):
+            depende = [dep for dep in STAGES[nome]['depende'] if dep in nomes]
+            if any(dep in falhas for dep in depende):
+                pendentes.remove(nome)
+                falhas.add(nome)
+                print(f'[{nome}] pulado: dependencia falhou')
+            elif all(dep in concluidos for dep in depende):
+                pendentes.remove(nome)
+                yield nome
+
+    with ThreadPoolExecutor(max_workers=jobs or len(STAGES)) as executor:
+        while pendentes or em_execucao:
+            for nome in list(prontos()):
+                chave = chave_estagio(fingerprints, STAGES[nome])
+                if nome not in forcar and esta_atualizado(fingerprints, nome, chave, estado):
+                    print(f'[{nome}] atualizado')
+                    concluidos.add(nome)
+                    continue
+                print(f'[{nome}] executando: {STAGES[nome]["descricao"]}')
+                em_execucao[executor.submit(executar_estagio, nome)] = (nome, chave)
+
+            if not em_execucao:
+                continue
+            feitos, _ = wait(em_execucao, return_when=FIRST_COMPLETED)
+            for futuro in feitos:
+                nome, chave = em_execucao.pop(futuro)
+                try:
+                    duracao = futuro.result()
+                except Exception as exc:
+                    falhas.add(nome)
+                    estado['estagios'].pop(nome, None)
+                    print(f'[{nome}] falhou: {exc}')
+                    continue
+                estado['estagios'][nome] = {
+                    'chave': chave,
+                    'saidas': fingerprints.padroes(STAGES[nome]['saidas']),
+                }
+                concluidos.add(nome)
+                print(f'[{nome}] concluido em {duracao:.1f}s')
+
+    salvar_estado(estado)
+    return falhas
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    padrao = [nome for nome, stage in STAGES.items() if not stage.get('opcional')]
+    parser.add_argument('estagios', nargs='*', help=f'padrao: {", ".join(padrao)}')
+    parser.add_argument('--forcar', action='store_true', help='reexecuta os estagios pedidos mesmo se atualizados')
+    parser.add_argument('--jobs', type=int, help='estagios em paralelo (padrao: todos os independentes)')
+    parser.add_argument('--listar', action='store_true', help='mostra os estagios e sai')
+    args = parser.parse_args()
+
+    if args.listar:
+        for nome, stage in STAGES.items():
+            depende = ', '.join(stage['depende']) or '-'
+            opcional = ' (opcional)' if stage.get('opcional') else ''
+            print(f'{nome:<11} depende de: {depende:<8} {stage["descricao"]}{opcional}')
+        return
+
+    desconhecidos = [nome for nome in args.estagios if nome not in STAGES]
+    if desconhecidos:
+        parser.error(f'estagios desconhecidos: {", ".join(desconhecidos)}')
+
+    pedidos = args.estagios or padrao
+    nomes = com_dependencias(pedidos)
+    forcar = set(pedidos) if args.forcar else set()
+
+    inicio = time.perf_counter()
+    falhas = rodar(nomes, forcar=forcar, jobs=args.jobs)
+    print(f'Pipeline finalizado em {time.perf_counter() - inicio:.1f}s')
+    if falhas:
+        raise SystemExit(f'Estagios com falha: {", ".join(sorted(falhas))}')
+
+
+if __name__ == '__main__':
+    main()
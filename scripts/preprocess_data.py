@@ -1,14 +1,19 @@
-﻿import csv
+﻿import argparse
+import csv
 import json
 import os
 import re
 import unicodedata
 from glob import glob
+from operator import itemgetter
+
+import numpy as np
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(BASE_DIR, 'data', 'extracted')
 OUTPUT_DIR = os.path.join(BASE_DIR, 'dashboard', 'public', 'data')
 MUN_PR_PATH = os.path.join(BASE_DIR, 'data', 'mun_PR.json')
+ANOMALIAS_PATH = os.path.join(BASE_DIR, 'data', 'anomalias_precos.csv')
 
 REQUIRED_FIELDS = [
     'ano',
@@ -134,8 +139,11 @@ def parse_number(value):
     raw = str(value).strip()
     if raw == '':
         return None
-    raw = raw.replace('.', '').replace(' ', '').replace('R$', '')
-    raw = raw.replace(',', '.')
+    raw = raw.replace(' ', '').replace('R$', '')
+    # "12.345,67" e "155.000" vem dos PDFs (ponto de milhar); "155000.0" e o
+    # float que o parse_pdfs grava no compiled.csv e nao pode perder o ponto.
+    if ',' in raw or re.fullmatch(r'-?\d{1,3}(\.\d{3})+', raw):
+        raw = raw.replace('.', '').replace(',', '.')
     try:
         return float(raw)
     except ValueError:
@@ -179,7 +187,177 @@ def build_metadata(rows):
     }
 
 
+# Deteccao de anomalias (escala log10). Precos errados por separador ou por
+# coluna deslocada costumam ficar 10x-1000x fora, entao o corte de quarentena
+# e um desvio de pelo menos 1 (10x) em relacao ao nivel esperado.
+LIMITE_Z = 3.5
+MAD_MINIMO = 0.05
+FATOR_QUARENTENA = 1.0
+FATOR_SALTO_ANUAL = 0.7
+# Classes de capacidade de uso, da mais valorizada para a menos valorizada.
+CLASSES_ORDEM = ['A-I', 'A-II', 'A-III', 'A-IV', 'B-V', 'B-VI', 'B-VII', 'C-VIII']
+ANOMALIAS_FIELDS = [
+    'ano',
+    'territorio',
+    'subcategoria',
+    'preco',
+    'preco_esperado',
+    'z_robusto',
+    'motivo',
+    'acao',
+]
+
+
+def _codificar(valores):
+    """Codigos inteiros para valores hashaveis, na ordem de primeira aparicao."""
+    mapa = {valor: codigo for codigo, valor in enumerate(dict.fromkeys(valores))}
+    codigos = np.fromiter(map(mapa.__getitem__, valores), dtype=np.int64, count=len(valores))
+    return codigos, mapa
+
+
+def _mediana_por_grupo(grupos, valores, n_grupos):
+    ordem = np.lexsort((valores, grupos))
+    ordenados = valores[ordem]
+    contagem = np.bincount(grupos, minlength=n_grupos)
+    inicio = np.concatenate(([0], np.cumsum(contagem)[:-1]))
+    meio_baixo = inicio + np.maximum(contagem - 1, 0) // 2
+    meio_alto = inicio + contagem // 2
+    medianas = np.full(n_grupos, np.nan)
+    com_dados = contagem > 0
+    medianas[com_dados] = (ordenados[meio_baixo[com_dados]] + ordenados[meio_alto[com_dados]]) / 2
+    return medianas
+
+
+def detectar_anomalias(rows, origens=None):
+    """Sinaliza precos suspeitos com operacoes vetorizadas.
+
+    - z robusto (mediana/MAD) do preco relativo ao nivel estadual da classe no
+      ano, por (territorio, subcategoria) ao longo dos anos;
+    - precos 10x acima ou abaixo da mediana estadual da classe no ano (so sinaliza);
+    - saltos anuais muito maiores que a variacao estadual da classe;
+    - classes fora de ordem (uma classe inteira mais barata que a seguinte
+      presente em CLASSES_ORDEM) no mesmo territorio, ano e tabela de origem.
+
+    `origens` (opcional, paralelo a `rows`) separa tabelas que nao devem ser
+    comparadas entre si: nos PDFs antigos cada tipo de solo tem sua propria
+    escala de classes, e solos diferentes caem na mesma classe.
+
+    Retorna (anomalias, quarentena): lista de dicts para o relatorio e o
+    conjunto de indices de `rows` que devem sair da base (z robusto alto e
+    pelo menos 10x fora do nivel esperado da serie).
+    """
+    precos = np.array([preco or 0.0 for preco in map(itemgetter('preco'), rows)], dtype=np.float64)
+    anos = np.array([ano or 0 for ano in map(itemgetter('ano'), rows)], dtype=np.int64)
+    indices = np.flatnonzero((precos > 0) & (anos > 0))
+    if not len(indices):
+        return [], set()
+
+    ano = anos[indices]
+    log_preco = np.log10(precos[indices])
+    territorio, territorios = _codificar(list(map(itemgetter('territorio'), rows)))
+    subcategoria, subcategorias = _codificar(list(map(itemgetter('subcategoria'), rows)))
+    territorio, subcategoria = territorio[indices], subcategoria[indices]
+    n_territorios, n_subcategorias = len(territorios), len(subcategorias)
+    ano_rel = ano - ano.min()
+    n_anos = int(ano_rel.max()) + 1
+
+    # Grupos como combinacoes dos codigos inteiros (sem tuplas por linha).
+    serie = territorio * n_subcategorias + subcategoria
+    n_series = n_territorios * n_subcategorias
+    ano_classe = subcategoria * n_anos + ano_rel
+    n_ano_classe = n_subcategorias * n_anos
+
+    # Residuo em relacao a mediana estadual da classe no ano remove a tendencia
+    # de alta dos precos; o que sobra e o nivel relativo do municipio.
+    nivel_estadual = _mediana_por_grupo(ano_classe, log_preco, n_ano_classe)
+    residuo = log_preco - nivel_estadual[ano_classe]
+    mediana_serie = _mediana_por_grupo(serie, residuo, n_series)
+    desvio = residuo - mediana_serie[serie]
+    mad = _mediana_por_grupo(serie, np.abs(desvio), n_series)
+    z = 0.6745 * desvio / np.maximum(mad[serie], MAD_MINIMO)
+    esperado = 10 ** (nivel_estadual[ano_classe] + mediana_serie[serie])
+
+    motivos = {}
+
+    def marcar(posicoes, motivo):
+        for posicao in posicoes.tolist():
+            motivos.setdefault(posicao, []).append(motivo)
+
+    outlier = np.abs(z) > LIMITE_Z
+    quarentena_mask = outlier & (np.abs(desvio) >= FATOR_QUARENTENA)
+    marcar(np.flatnonzero(outlier), 'z_robusto')
+    # Series inteiras erradas (ex.: cabecalho lido como municipio) tem z baixo;
+    # o desvio em relacao ao nivel estadual as mostra. Como ha municipios
+    # legitimamente muito abaixo da media, isso so sinaliza.
+    marcar(np.flatnonzero(np.abs(residuo) >= FATOR_QUARENTENA), 'nivel_estadual')
+
+    # Saltos anuais: anos consecutivos da mesma serie (media dos duplicados).
+    ordem = np.lexsort((ano, serie))
+    s_ord, a_ord, r_ord = serie[ordem], ano[ordem], residuo[ordem]
+    consecutivo = (s_ord[1:] == s_ord[:-1]) & (a_ord[1:] == a_ord[:-1] + 1)
+    salto = consecutivo & (np.abs(r_ord[1:] - r_ord[:-1]) >= FATOR_SALTO_ANUAL)
+    marcar(ordem[1:][salto], 'salto_anual')
+
+    # Ordem das classes: cada classe presente deveria valer pelo menos o mesmo
+    # que a proxima presente na tabela (territorio, ano, origem). So conta como
+    # inversao se todos os precos da melhor ficam abaixo de todos os da pior.
+    rank_sub = np.full(n_subcategorias, -1, dtype=np.int64)
+    for rank, classe in enumerate(CLASSES_ORDEM):
+        if classe in subcategorias:
+            rank_sub[subcategorias[classe]] = rank
+    rank = rank_sub[subcategoria]
+    if origens is None:
+        origem, n_origens = np.zeros(len(indices), dtype=np.int64), 1
+    else:
+        origem, mapa_origens = _codificar(origens)
+        origem, n_origens = origem[indices], len(mapa_origens)
+    com_classe = np.flatnonzero(rank >= 0)
+    tabela = (territorio[com_classe] * n_origens + origem[com_classe]) * n_anos + ano_rel[com_classe]
+    celulas, celula = np.unique(tabela * len(CLASSES_ORDEM) + rank[com_classe], return_inverse=True)
+    celula = celula.reshape(-1)
+    preco = precos[indices][com_classe]
+    maximo = np.full(len(celulas), -np.inf)
+    minimo = np.full(len(celulas), np.inf)
+    np.maximum.at(maximo, celula, preco)
+    np.minimum.at(minimo, celula, preco)
+    # Celulas vem ordenadas por tabela e rank: vizinhas na mesma tabela sao
+    # classes consecutivas presentes.
+    mesma_tabela = celulas[1:] // len(CLASSES_ORDEM) == celulas[:-1] // len(CLASSES_ORDEM)
+    invertida = mesma_tabela & (maximo[:-1] < minimo[1:])
+    celula_invertida = np.zeros(len(celulas), dtype=bool)
+    celula_invertida[:-1] |= invertida
+    celula_invertida[1:] |= invertida
+    marcar(com_classe[celula_invertida[celula]], 'ordem_classes')
+
+    anomalias = []
+    quarentena = set()
+    for posicao, lista in sorted(motivos.items()):
+        row = rows[indices[posicao]]
+        isolar = bool(quarentena_mask[posicao])
+        if isolar:
+            quarentena.add(int(indices[posicao]))
+        anomalias.append({
+            'ano': row['ano'],
+            'territorio': row['territorio'],
+            'subcategoria': row['subcategoria'],
+            'preco': row['preco'],
+            'preco_esperado': round(float(esperado[posicao]), 2),
+            'z_robusto': round(float(z[posicao]), 2),
+            'motivo': '|'.join(lista),
+            'acao': 'quarentena' if isolar else 'sinalizado',
+        })
+    return anomalias, quarentena
+
+
 def main():
+    parser = argparse.ArgumentParser(description='Gera os JSONs do dashboard a partir dos CSVs extraidos.')
+    parser.add_argument(
+        '--sem-quarentena',
+        action='store_true',
+        help='apenas sinaliza as anomalias no relatorio, sem remove-las da base',
+    )
+    args = parser.parse_args()
+
     compiled_path = os.path.join(DATA_DIR, 'compiled.csv')
     if os.path.exists(compiled_path):
         csv_files = [compiled_path]
@@ -192,6 +370,7 @@ def main():
     mun_map = load_municipios_map()
 
     rows = []
+    origens = []
     for path in csv_files:
         with open(path, encoding='utf-8') as handle:
             reader = csv.DictReader(handle)
@@ -222,6 +401,22 @@ def main():
                     'unidade': row.get('unidade', '').strip(),
                 }
                 rows.append(registro)
+                origens.append(categoria_raw)
+
+    anomalias, quarentena = detectar_anomalias(rows, origens)
+    if not args.sem_quarentena and quarentena:
+        rows = [row for i, row in enumerate(rows) if i not in quarentena]
+    with open(ANOMALIAS_PATH, 'w', encoding='utf-8', newline='') as handle:
+        writer = csv.DictWriter(handle, fieldnames=ANOMALIAS_FIELDS)
+        writer.writeheader()
+        if args.sem_quarentena:
+            for item in anomalias:
+                item['acao'] = 'sinalizado'
+        writer.writerows(anomalias)
+    print(
+        f'Anomalias: {len(anomalias)} sinalizadas, '
+        f'{0 if args.sem_quarentena else len(quarentena)} em quarentena ({ANOMALIAS_PATH})'
+    )
 
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     detailed_path = os.path.join(OUTPUT_DIR, 'detailed.json')